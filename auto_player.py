@@ -8,17 +8,37 @@ Fully Automated DJ Player with Library Support
 """
 
 import os
+import re
 import sys
+import shutil
 import time
 import sqlite3
+import selectors
 import subprocess
 import requests
-from pathlib import Path
-from threading import Thread, Event, Lock
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from collections import deque, OrderedDict
+from functools import lru_cache
+from threading import Thread, Event, Lock, BoundedSemaphore, local
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import json
 from urllib.parse import urlparse, parse_qs
 
+# yt-dlp Python API (in-process downloads, no CLI fork per song)
+try:
+    import yt_dlp
+    _ytdlp_match_filter = yt_dlp.utils.match_filter_func('!is_live & !live_chat')
+except ImportError:
+    yt_dlp = None
+    _ytdlp_match_filter = None
+    print("⚠️  yt_dlp module not installed - downloads will shell out to yt-dlp")
+
+# In-process audio metadata (no ffprobe fork per lookup)
+try:
+    from mutagen import File as MutagenFile
+except ImportError:
+    MutagenFile = None
+    print("⚠️  mutagen not installed - durations will use ffprobe")
+
 # YouTube Music API
 try:
     from ytmusicapi import YTMusic
@@ -35,6 +55,7 @@ CONTROL_PORT = 8888
 SERVER_URL = 'http://localhost:3000'
 CROSSFADE_DURATION = 10
 PRELOAD_COUNT = 3
+DOWNLOAD_WORKERS = 2  # concurrent yt-dlp downloads (each re-encodes to mp3)
 SILENCE_THRESHOLD = '-50dB'
 SILENCE_DURATION = 0.5
 
@@ -69,84 +90,304 @@ class PlayerState:
 
 player_state = PlayerState()
 stop_event = Event()
-download_lock = Lock()
+http_session = requests.Session()  # keep-alive pool for the Node server API
+download_lock = BoundedSemaphore(DOWNLOAD_WORKERS)
 last_generate_time = 0  # Track last auto-playlist generation to prevent spam
+_db_local = local()
+command_queue = deque()  # HTTP handlers append, playback thread drains
+command_event = Event()  # set on push so sleep-based waits wake immediately
+_command_wakeup_r, _command_wakeup_w = os.pipe()  # wakes selector-based waits
+os.set_blocking(_command_wakeup_r, False)
+os.set_blocking(_command_wakeup_w, False)
+
+def push_command(command, value=None):
+    """Queue a control command and wake the playback thread right away"""
+    command_queue.append((command, value))
+    command_event.set()
+    try:
+        os.write(_command_wakeup_w, b'x')
+    except OSError:
+        pass  # pipe full - a wakeup is already pending
+
+def apply_pending_commands():
+    """Drain queued control commands into player_state (one lock acquisition)"""
+    # Clear before the emptiness check: if a push lands mid-drain its set()
+    # survives and costs one spurious wakeup, whereas clearing only on the
+    # non-empty path could leave the event stuck set with an empty queue,
+    # turning every command_event.wait() into a busy spin
+    command_event.clear()
+    if not command_queue:
+        return
+    with player_state.lock:
+        while command_queue:
+            try:
+                command, value = command_queue.popleft()
+            except IndexError:
+                break
+            if command == 'skip':
+                player_state.skip_requested = True
+                if player_state.is_paused:
+                    player_state.is_paused = False
+            elif command == 'pause':
+                if player_state.is_playing and not player_state.is_paused:
+                    player_state.is_paused = True
+            elif command == 'resume':
+                player_state.is_paused = False
+            elif command == 'volume':
+                player_state.volume = value
+
+def get_db():
+    """Persistent per-thread SQLite connection (WAL so reads don't block the writer)"""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        conn.execute('PRAGMA temp_store=MEMORY')  # sort scratch stays off the SD card
+        _db_local.conn = conn
+    return conn
 
 print("🎵 DJ Auto Player Starting...")
 os.makedirs(MUSIC_LIBRARY, exist_ok=True)
 
+_filename_unsafe_re = re.compile(r'[^\w \-]')  # \w covers alnum plus underscore
+
+def sanitize_filename(text):
+    """Strip characters that are unsafe in library filenames"""
+    return _filename_unsafe_re.sub('', text).strip()
+
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.flac', '.wav')
+_library_index = {}  # lowercased filename stem -> absolute path
+_library_index_mtime = None
+
+def refresh_library_index():
+    """Rebuild the filename index, but only when the library directory changed"""
+    global _library_index, _library_index_mtime
+    try:
+        dir_mtime = os.stat(MUSIC_LIBRARY).st_mtime
+    except OSError:
+        return
+    if dir_mtime == _library_index_mtime:
+        return
+    index = {}
+    with os.scandir(MUSIC_LIBRARY) as entries:
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() in AUDIO_EXTENSIONS and entry.is_file():
+                index[stem.lower()] = os.path.abspath(entry.path)
+    _library_index = index
+    _library_index_mtime = dir_mtime
+
 def search_song_in_library(song_id, title, artist):
     """Search for song file in music library"""
     try:
-        safe_artist = "".join(c for c in artist if c.isalnum() or c in (' ', '-', '_')).strip()
-        safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
+        # The music_library catalog is indexed by song_id - check it before
+        # any filename matching (stale rows are skipped via the exists check)
+        try:
+            cursor = get_db().cursor()
+            cursor.execute("SELECT file_path FROM music_library WHERE song_id = ?", (song_id,))
+            row = cursor.fetchone()
+            if row and row[0] and os.path.exists(row[0]):
+                return row[0]
+        except sqlite3.Error:
+            pass  # table may not exist until the server first runs
+
+        safe_artist = sanitize_filename(artist)
+        safe_title = sanitize_filename(title)
+
+        # Fast path: downloads are named "Artist - Title.mp3", so try that
+        # exact file before touching (or rebuilding) the index
+        direct_path = os.path.join(MUSIC_LIBRARY, f"{safe_artist} - {safe_title}.mp3")
+        if os.path.exists(direct_path):
+            return os.path.abspath(direct_path)
+
+        refresh_library_index()
         patterns = [f"{safe_artist} - {safe_title}", f"{safe_artist}-{safe_title}", safe_title, song_id]
+        index = _library_index
         for pattern in patterns:
-            for ext in ['.mp3', '.m4a', '.flac', '.wav']:
-                for file in Path(MUSIC_LIBRARY).glob(f"*{pattern}*{ext}"):
-                    return str(file.absolute())
+            hit = index.get(pattern.lower())
+            if hit:
+                return hit
+        for pattern in patterns:
+            needle = pattern.lower()
+            if not needle:
+                continue
+            for stem, path in index.items():
+                if needle in stem:
+                    return path
         return None
     except:
         return None
 
+_inflight_lock = Lock()
+_inflight_downloads = {}  # song key -> Event set when that download finishes
+
 def download_from_youtube(song_id, title, artist):
-    """Download song from YouTube"""
+    """Download song from YouTube (bounded concurrency, one fetch per song)"""
     try:
-        safe_title = "".join(c for c in f"{artist} - {title}" if c.isalnum() or c in (' ', '-', '_')).strip()
+        safe_title = sanitize_filename(f"{artist} - {title}")
         output_path = os.path.join(MUSIC_LIBRARY, f"{safe_title}.mp3")
-        
-        if os.path.exists(output_path):
-            return output_path
-        
-        # Build search query - STRONG audio preference
-        # "topic" gets auto-generated topic channels (usually audio-only)
-        # Multiple exclusions to avoid music videos
-        search_query = f"{title} {artist} audio topic -video -music video -official video -lyric video -lyrics -visualizer -live -concert"
-        
-        print(f"⬇️  Downloading: {safe_title}")
-        
-        cmd = [
-            'yt-dlp',
-            '-f', 'bestaudio/best',  # Prefer audio-only format
-            '-x',
-            '--audio-format', 'mp3',
-            '--audio-quality', '0',
-            '--match-filter', '!is_live & !live_chat',  # Fixed typo: was 'natch'
-            '--no-playlist',
-            '--quiet',
-            '-o', output_path,
-            f"ytsearch1:{search_query}"
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-        
-        if result.returncode == 0 and os.path.exists(output_path):
-            print(f"✅ Downloaded: {safe_title}")
-            return output_path
-        else:
-            print(f"❌ Download failed: {safe_title}")
-            return None
-            
+
+        refresh_library_index()
+        existing = _library_index.get(safe_title.lower())
+        if existing:
+            return existing
+
+        # One fetch per song: the preloader, prefetcher, bulk workers, and
+        # the playback loop all chase the same upcoming songs, so the first
+        # caller downloads and later callers wait on its Event instead of
+        # two yt-dlp runs writing the same file
+        with _inflight_lock:
+            done = _inflight_downloads.get(safe_title)
+            owner = done is None
+            if owner:
+                done = Event()
+                _inflight_downloads[safe_title] = done
+
+        if not owner:
+            done.wait(timeout=300)
+            refresh_library_index()
+            return _library_index.get(safe_title.lower())
+
+        try:
+            with download_lock:  # bounded worker slots for the actual transfer
+                # Build search query - STRONG audio preference
+                # "topic" gets auto-generated topic channels (usually audio-only)
+                # Multiple exclusions to avoid music videos
+                search_query = f"{title} {artist} audio topic -video -music video -official video -lyric video -lyrics -visualizer -live -concert"
+
+                print(f"⬇️  Downloading: {safe_title}")
+
+                if yt_dlp is not None:
+                    downloaded = _download_with_ytdlp(search_query, output_path)
+                else:
+                    downloaded = _download_with_subprocess(search_query, output_path)
+
+                if downloaded and os.path.exists(output_path):
+                    # Register right away so concurrent lookups don't wait for a rescan
+                    _library_index[safe_title.lower()] = os.path.abspath(output_path)
+                    print(f"✅ Downloaded: {safe_title}")
+                    return output_path
+                else:
+                    print(f"❌ Download failed: {safe_title}")
+                    return None
+        finally:
+            with _inflight_lock:
+                _inflight_downloads.pop(safe_title, None)
+            done.set()
+
     except Exception as e:
         print(f"❌ Error downloading {title}: {e}")
         return None
-    except Exception as e:
-        print(f"❌ Download error: {e}")
-        return None
 
-def get_audio_duration(file_path):
+def _download_with_ytdlp(search_query, output_path):
+    """Download in-process via the yt-dlp API"""
+    opts = {
+        'format': 'bestaudio/best',  # Prefer audio-only format
+        'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3', 'preferredquality': '0'}],
+        'match_filter': _ytdlp_match_filter,
+        'noplaylist': True,
+        'quiet': True,
+        'no_warnings': True,
+        'socket_timeout': 30,
+        'concurrent_fragment_downloads': 4,  # YouTube audio often comes as DASH fragments
+        'outtmpl': output_path,
+        # Trim leading/trailing silence while ffmpeg is already re-encoding to mp3,
+        # so playback and duration metadata agree and per-song trims become no-ops
+        'postprocessor_args': {'extractaudio+ffmpeg_o': ['-af', build_silence_trim_filter()]},
+    }
+    try:
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            return ydl.download([f"ytsearch1:{search_query}"]) == 0
+    except Exception:
+        return False
+
+def _download_with_subprocess(search_query, output_path):
+    """Fallback download via the yt-dlp CLI"""
+    cmd = [
+        'yt-dlp',
+        '-f', 'bestaudio/best',  # Prefer audio-only format
+        '-x',
+        '--audio-format', 'mp3',
+        '--audio-quality', '0',
+        '--match-filter', '!is_live & !live_chat',  # Fixed typo: was 'natch'
+        '--postprocessor-args', f'ExtractAudio:-af {build_silence_trim_filter()}',
+        '--concurrent-fragments', '4',
+        '--no-playlist',
+        '--quiet',
+        '-o', output_path,
+        f"ytsearch1:{search_query}"
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+    return result.returncode == 0
+
+@lru_cache(maxsize=512)
+def _probe_duration(file_path, mtime):
+    """Read duration from the container header in-process, ffprobe as fallback"""
+    if MutagenFile is not None:
+        try:
+            length = MutagenFile(file_path).info.length
+            if length:
+                return length
+        except:
+            pass
     try:
-        cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', 
+        cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
                '-of', 'default=noprint_wrappers=1:nokey=1', file_path]
         result = subprocess.run(cmd, capture_output=True, text=True)
         return float(result.stdout.strip())
     except:
         return 0
 
+DURATION_CACHE_PATH = os.path.join(MUSIC_LIBRARY, '.durations.json')
+_duration_memo = {}  # path -> [mtime, size, seconds], survives restarts
+
+def _load_duration_memo():
+    global _duration_memo
+    try:
+        with open(DURATION_CACHE_PATH) as f:
+            _duration_memo = json.load(f)
+    except (OSError, ValueError):
+        _duration_memo = {}
+
+def _save_duration_memo():
+    try:
+        tmp_path = DURATION_CACHE_PATH + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(_duration_memo, f)
+        os.replace(tmp_path, DURATION_CACHE_PATH)
+    except OSError:
+        pass
+
+_load_duration_memo()
+
+def get_audio_duration(file_path):
+    try:
+        stat = os.stat(file_path)
+        entry = _duration_memo.get(file_path)
+        if entry and entry[0] == stat.st_mtime and entry[1] == stat.st_size:
+            return entry[2]
+        duration = _probe_duration(file_path, stat.st_mtime)
+        if duration:
+            _duration_memo[file_path] = [stat.st_mtime, stat.st_size, duration]
+            _save_duration_memo()
+        return duration
+    except:
+        return 0
+
+def build_silence_trim_filter():
+    """Silence trim applied once when a file enters the library"""
+    # One silenceremove instance handles both ends - half the filter
+    # instantiations and buffer passes of the old two-filter chain
+    return (f"silenceremove=start_periods=1:start_duration={SILENCE_DURATION}:start_threshold={SILENCE_THRESHOLD}"
+            f":stop_periods=1:stop_duration={SILENCE_DURATION}:stop_threshold={SILENCE_THRESHOLD}")
+
+_silence_trim_filter = build_silence_trim_filter()  # static under fixed config
+
+@lru_cache(maxsize=128)
 def build_audio_filter(volume, duration=None, fade_out=False, fade_in=False):
     filters = [
-        f"silenceremove=start_periods=1:start_duration={SILENCE_DURATION}:start_threshold={SILENCE_THRESHOLD}",
-        f"silenceremove=stop_periods=1:stop_duration={SILENCE_DURATION}:stop_threshold={SILENCE_THRESHOLD}",
+        _silence_trim_filter,  # no-op for files trimmed at download, trims older ones
         f"volume={volume / 100}"
     ]
     if fade_out and duration:
@@ -156,12 +397,80 @@ def build_audio_filter(volume, duration=None, fade_out=False, fade_in=False):
         filters.append(f"afade=t=in:st=0:d={CROSSFADE_DURATION}")
     return ','.join(filters)
 
+@lru_cache(maxsize=None)
+def _resolve_ffplay():
+    """Resolve ffplay to an absolute path once instead of a PATH walk per spawn"""
+    return shutil.which('ffplay') or 'ffplay'
+
+def build_ffplay_cmd(file_path, audio_filter, start_position=None):
+    """ffplay invocation with low-latency flags so songs start without probe delay"""
+    cmd = [_resolve_ffplay(), '-nodisp', '-autoexit', '-fflags', 'nobuffer', '-analyzeduration', '0']
+    if start_position:
+        cmd += ['-ss', str(start_position)]
+    cmd += ['-af', audio_filter, file_path]
+    return cmd
+
+def watch_process(process):
+    """Watch a child process via pidfd so waits wake the instant it exits"""
+    try:
+        fd = os.pidfd_open(process.pid, 0)
+    except (AttributeError, OSError):
+        return None, None  # kernel < 5.3 - callers fall back to sleep-polling
+    sel = selectors.DefaultSelector()
+    sel.register(fd, selectors.EVENT_READ)
+    sel.register(_command_wakeup_r, selectors.EVENT_READ)
+    return sel, fd
+
+def wait_process(sel, timeout):
+    """Block until the watched process exits, a command arrives, or timeout elapses"""
+    if sel is None:
+        command_event.wait(timeout)
+        return
+    for key, _ in sel.select(timeout):
+        if key.fd == _command_wakeup_r:
+            try:
+                os.read(_command_wakeup_r, 64)
+            except OSError:
+                pass
+
+def unwatch_process(sel, fd):
+    if sel is not None:
+        sel.close()
+        os.close(fd)
+
+def check_playback_tick(elapsed, duration, offset=0):
+    """Shared per-tick control handling for the playback loops.
+
+    Updates position (or paused_position) and returns 'skipped'/'paused'
+    when the caller should stop its process, None to keep playing."""
+    with player_state.lock:
+        skip = player_state.skip_requested
+        paused = player_state.is_paused
+        if skip:
+            player_state.skip_requested = False
+        elif paused:
+            player_state.paused_position = offset + elapsed
+            player_state.position = player_state.paused_position
+        else:
+            player_state.position = min(offset + elapsed, duration)
+    if skip:
+        return 'skipped'
+    if paused:
+        return 'paused'
+    return None
+
+def spawn_player(cmd):
+    """Spawn ffplay in its own session so terminal signals (Ctrl+C) reach only
+    the player, which then shuts its children down in an orderly way"""
+    return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            stdin=subprocess.DEVNULL, start_new_session=True)
+
 def start_crossfade_song(file_path, volume):
     try:
         duration = get_audio_duration(file_path)
         audio_filter = build_audio_filter(volume, duration, fade_out=False, fade_in=True)
-        cmd = ['ffplay', '-nodisp', '-autoexit', '-af', audio_filter, file_path]
-        process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, stdin=subprocess.PIPE)
+        cmd = build_ffplay_cmd(file_path, audio_filter)
+        process = spawn_player(cmd)
         print(f"🎵 Crossfade: {os.path.basename(file_path)}")
         return process
     except Exception as e:
@@ -186,74 +495,65 @@ def play_song_with_crossfade(file_path, next_file, queue_id, is_auto=False):
         
         has_next = next_file is not None and os.path.exists(next_file)
         audio_filter = build_audio_filter(player_state.volume, duration, fade_out=has_next, fade_in=False)
-        cmd = ['ffplay', '-nodisp', '-autoexit', '-af', audio_filter, file_path]
+        cmd = build_ffplay_cmd(file_path, audio_filter)
         
         with player_state.lock:
-            player_state.current_process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, stdin=subprocess.PIPE)
-        
-        start_time = time.time()
-        
-        while True:
-            if player_state.current_process is None:
-                break
-            poll_result = player_state.current_process.poll()
-            if poll_result is not None:
-                # Main song finished - MUST terminate crossfade to prevent double playback
-                if player_state.crossfade_process:
-                    try:
-                        player_state.crossfade_process.terminate()
-                        player_state.crossfade_process.wait(timeout=1)  # Wait for clean termination
-                        player_state.crossfade_process = None
-                        print("🔇 Crossfade terminated (main song ended)")
-                    except:
-                        pass
-                with player_state.lock:
-                    player_state.is_playing = False
-                    player_state.position = 0
-                return 'completed'
-            
-            if stop_event.is_set():
-                try: player_state.current_process.terminate()
-                except: pass
-                return 'stopped'
-            
-            with player_state.lock:
-                skip = player_state.skip_requested
-            if skip:
-                try:
-                    player_state.current_process.terminate()
-                    if player_state.crossfade_process:
-                        player_state.crossfade_process.terminate()
-                except: pass
-                with player_state.lock:
-                    player_state.skip_requested = False
-                return 'skipped'
-            
-            with player_state.lock:
-                paused = player_state.is_paused
-            if paused:
-                elapsed = time.time() - start_time
-                with player_state.lock:
-                    player_state.paused_position = elapsed
-                    player_state.position = elapsed
-                try:
-                    player_state.current_process.terminate()
+            player_state.current_process = spawn_player(cmd)
+
+        start_time = time.monotonic()
+        sel, pidfd = watch_process(player_state.current_process)
+
+        if has_next:
+            # Warm the duration cache in parallel so the crossfade spawn
+            # reads it from memory instead of probing at the fade point
+            Thread(target=get_audio_duration, args=(next_file,), daemon=True).start()
+
+        try:
+            while True:
+                apply_pending_commands()
+                if player_state.current_process is None:
+                    break
+                poll_result = player_state.current_process.poll()
+                if poll_result is not None:
+                    # Main song finished - MUST terminate crossfade to prevent double playback
                     if player_state.crossfade_process:
-                        player_state.crossfade_process.terminate()
-                except: pass
-                return 'paused'
-            
-            elapsed = time.time() - start_time
-            with player_state.lock:
-                player_state.position = min(elapsed, duration)
-            
-            if has_next and not crossfade_started and elapsed >= crossfade_time:
-                print(f"🔀 Crossfade starting...")
-                player_state.crossfade_process = start_crossfade_song(next_file, player_state.volume)
-                crossfade_started = True
-            
-            time.sleep(0.25)
-        
+                        try:
+                            player_state.crossfade_process.terminate()
+                            player_state.crossfade_process.wait(timeout=1)  # Wait for clean termination
+                            player_state.crossfade_process = None
+                            print("🔇 Crossfade terminated (main song ended)")
+                        except:
+                            pass
+                    with player_state.lock:
+                        player_state.is_playing = False
+                        player_state.position = 0
+                    return 'completed'
+
+                if stop_event.is_set():
+                    try: player_state.current_process.terminate()
+                    except: pass
+                    return 'stopped'
+
+                elapsed = time.monotonic() - start_time
+                result = check_playback_tick(elapsed, duration)
+                if result:
+                    try:
+                        player_state.current_process.terminate()
+                        if player_state.crossfade_process:
+                            player_state.crossfade_process.terminate()
+                    except: pass
+                    return result
+
+                if has_next and not crossfade_started and elapsed >= crossfade_time:
+                    print(f"🔀 Crossfade starting...")
+                    player_state.crossfade_process = start_crossfade_song(next_file, player_state.volume)
+                    crossfade_started = True
+
+                # Short timeout keeps skip/pause responsive; process exit wakes us instantly
+                wait_process(sel, 0.25)
+        finally:
+            unwatch_process(sel, pidfd)
+
         return 'completed'
     except Exception as e:
         print(f"❌ Playback error: {e}")
@@ -269,161 +569,193 @@ def resume_song(file_path, start_position, queue_id):
         
         print(f"▶️  Resuming from {start_position:.1f}s")
         audio_filter = build_audio_filter(player_state.volume, duration, fade_out=False, fade_in=False)
-        cmd = ['ffplay', '-nodisp', '-autoexit', '-ss', str(start_position), '-af', audio_filter, file_path]
+        cmd = build_ffplay_cmd(file_path, audio_filter, start_position=start_position)
         
         with player_state.lock:
-            player_state.current_process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, stdin=subprocess.PIPE)
+            player_state.current_process = spawn_player(cmd)
         
-        start_time = time.time()
-        
-        while True:
-            if player_state.current_process is None:
-                break
-            poll_result = player_state.current_process.poll()
-            if poll_result is not None:
-                return 'completed'
-            if stop_event.is_set():
-                try: player_state.current_process.terminate()
-                except: pass
-                return 'stopped'
-            with player_state.lock:
-                skip = player_state.skip_requested
-            if skip:
-                try: player_state.current_process.terminate()
-                except: pass
-                with player_state.lock:
-                    player_state.skip_requested = False
-                return 'skipped'
-            with player_state.lock:
-                paused = player_state.is_paused
-            if paused:
-                elapsed = time.time() - start_time
-                with player_state.lock:
-                    player_state.paused_position = start_position + elapsed
-                    player_state.position = player_state.paused_position
-                try: player_state.current_process.terminate()
-                except: pass
-                return 'paused'
-            elapsed = time.time() - start_time
-            with player_state.lock:
-                player_state.position = min(start_position + elapsed, duration)
-            time.sleep(0.25)
+        start_time = time.monotonic()
+        sel, pidfd = watch_process(player_state.current_process)
+
+        try:
+            while True:
+                apply_pending_commands()
+                if player_state.current_process is None:
+                    break
+                poll_result = player_state.current_process.poll()
+                if poll_result is not None:
+                    return 'completed'
+                if stop_event.is_set():
+                    try: player_state.current_process.terminate()
+                    except: pass
+                    return 'stopped'
+                elapsed = time.monotonic() - start_time
+                result = check_playback_tick(elapsed, duration, offset=start_position)
+                if result:
+                    try: player_state.current_process.terminate()
+                    except: pass
+                    return result
+                wait_process(sel, 0.25)
+        finally:
+            unwatch_process(sel, pidfd)
         return 'completed'
     except Exception as e:
         print(f"❌ Resume error: {e}")
         return 'error'
 
+def _process_download_item(item):
+    """Download one bulk-queue item and report the outcome to the server"""
+    deprioritize_thread()
+    try:
+        item_id = item['id']
+        title = item['title']
+        artist = item['artist']
+
+        file_path = download_from_youtube(item['song_id'], title, artist)
+
+        if file_path:
+            # Update status to completed
+            http_session.post(f"{SERVER_URL}/api/download-queue/{item_id}/status",
+                          json={'status': 'completed', 'filePath': file_path, 'songId': item['song_id']},
+                          timeout=5)
+            print(f"✅ Completed: {title}")
+        else:
+            # Update status to failed
+            http_session.post(f"{SERVER_URL}/api/download-queue/{item_id}/status",
+                          json={'status': 'failed'}, timeout=5)
+            print(f"❌ Failed: {title}")
+    except Exception as e:
+        pass  # Server might not be running yet
+
 def process_download_queue():
     """Background thread to process bulk download queue"""
     print("📥 Download queue processor started...")
+    # Plain daemon threads, not a ThreadPoolExecutor: the executor's atexit
+    # hook joins non-daemon workers, so an in-flight download would hold the
+    # whole process open after Ctrl+C. Concurrency is already bounded by
+    # download_lock inside download_from_youtube.
+    workers = []
+    idle_wait = 5
     while not stop_event.is_set():
         try:
+            workers = [w for w in workers if w.is_alive()]
+            if len(workers) >= DOWNLOAD_WORKERS:
+                # Workers full: this isn't an idle queue, so don't grow the
+                # backoff - check again as soon as a download finishes
+                workers[0].join(timeout=5)
+                continue
             # Get next item from download queue
-            response = requests.get(f"{SERVER_URL}/api/download-queue/next", timeout=5)
+            response = http_session.get(f"{SERVER_URL}/api/download-queue/next", timeout=5)
             if response.ok:
-                data = response.json()
-                item = data.get('song')
-                
+                item = response.json().get('song')
                 if item:
-                    item_id = item['id']
-                    title = item['title']
-                    artist = item['artist']
-                    genre = item.get('genre', 'general')
-                    
-                    # Update status to downloading
-                    requests.post(f"{SERVER_URL}/api/download-queue/{item_id}/status", 
+                    # Update status to downloading so /next moves on
+                    http_session.post(f"{SERVER_URL}/api/download-queue/{item['id']}/status",
                                   json={'status': 'downloading'}, timeout=5)
-                    
-                    print(f"📥 Downloading: {artist} - {title}")
-                    
-                    with download_lock:
-                        file_path = download_from_youtube(item['song_id'], title, artist)
-                    
-                    if file_path:
-                        # Update status to completed
-                        requests.post(f"{SERVER_URL}/api/download-queue/{item_id}/status",
-                                      json={'status': 'completed', 'filePath': file_path, 'songId': item['song_id']}, 
-                                      timeout=5)
-                        print(f"✅ Completed: {title}")
-                    else:
-                        # Update status to failed
-                        requests.post(f"{SERVER_URL}/api/download-queue/{item_id}/status",
-                                      json={'status': 'failed'}, timeout=5)
-                        print(f"❌ Failed: {title}")
+                    print(f"📥 Downloading: {item['artist']} - {item['title']}")
+                    worker = Thread(target=_process_download_item, args=(item,), daemon=True)
+                    worker.start()
+                    workers.append(worker)
+                    idle_wait = 5  # queue is active - poll eagerly again
+                    continue  # fill the remaining worker slot right away
         except Exception as e:
             pass  # Server might not be running yet
-        
-        time.sleep(5)
+
+        # The server had nothing for us (or wasn't reachable) - back off so
+        # an idle night isn't thousands of pointless polls; work resets the pace
+        stop_event.wait(idle_wait)
+        idle_wait = min(idle_wait * 2, 30)
 
 def preload_queue():
     """Background thread to pre-download upcoming songs"""
+    deprioritize_thread()
     print("📥 Pre-download service started...")
     while not stop_event.is_set():
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
+            cursor = get_db().cursor()
             cursor.execute("SELECT id, song_id, title, artist FROM queue WHERE played = 0 ORDER BY requested_at ASC LIMIT ?", (PRELOAD_COUNT,))
             songs = cursor.fetchall()
-            conn.close()
             
             for queue_id, song_id, title, artist in songs:
                 if stop_event.is_set():
                     break
                 file_path = search_song_in_library(song_id, title, artist)
                 if not file_path:
-                    with download_lock:
-                        print(f"📥 Pre-downloading: {title}")
-                        download_from_youtube(song_id, title, artist)
-            time.sleep(10)
+                    print(f"📥 Pre-downloading: {title}")
+                    download_from_youtube(song_id, title, artist)
+            stop_event.wait(10)
         except Exception as e:
-            time.sleep(10)
+            stop_event.wait(10)
+
+def deprioritize_thread():
+    """Lower this worker thread's CPU priority (Linux nice is per-thread) so
+    ffplay decoding keeps the CPU while downloads re-encode in the background"""
+    try:
+        os.nice(10)
+    except OSError:
+        pass
+
+def prefetch_song(song_id, title, artist):
+    """Download an upcoming song in the background while the current one plays"""
+    deprioritize_thread()
+    try:
+        if not search_song_in_library(song_id, title, artist):
+            print(f"📥 Prefetching next: {title}")
+            download_from_youtube(song_id, title, artist)
+    except:
+        pass
 
 def mark_song_played(queue_id):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM queue WHERE id = ?", (queue_id,))
-        song = cursor.fetchone()
+        conn = get_db()
+        # "with conn" commits or rolls back unconditionally: even a 0-row
+        # UPDATE (queue cleared mid-song) opens a write transaction, and on
+        # this persistent connection leaving it open would hold the WAL
+        # write lock against the Node server forever
+        with conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("UPDATE queue SET played = 1 WHERE id = ? RETURNING song_id, title, artist", (queue_id,))
+                song = cursor.fetchone()
+            except sqlite3.OperationalError:
+                # SQLite < 3.35 has no RETURNING - fall back to read-then-update
+                cursor.execute("SELECT song_id, title, artist FROM queue WHERE id = ?", (queue_id,))
+                song = cursor.fetchone()
+                if song:
+                    cursor.execute("UPDATE queue SET played = 1 WHERE id = ?", (queue_id,))
+            if song:
+                cursor.execute("INSERT INTO recently_played (song_id, title, artist) VALUES (?, ?, ?)", song)
         if song:
-            cursor.execute("UPDATE queue SET played = 1 WHERE id = ?", (queue_id,))
-            cursor.execute("INSERT INTO recently_played (song_id, title, artist) VALUES (?, ?, ?)", (song[1], song[2], song[3]))
-            conn.commit()
-            print(f"✅ Played: {song[2]}")
-        conn.close()
+            print(f"✅ Played: {song[1]}")
     except Exception as e:
         print(f"❌ Mark played error: {e}")
 
-def get_auto_playlist_song():
-    """Get next song from auto-playlist queue, then remove it and trigger refill"""
+def get_auto_playlist_songs(count=2):
+    """Get the upcoming auto-playlist songs (current + crossfade) in one API call"""
     try:
-        # Get first song from auto_playlist_queue
-        response = requests.get(f"{SERVER_URL}/api/library/upcoming", timeout=5)
+        response = http_session.get(f"{SERVER_URL}/api/library/upcoming", timeout=5)
         if response.ok:
             data = response.json()
-            songs = data.get('songs', [])
-            if songs and len(songs) > 0:
-                # Return first song
-                song = songs[0]
-                return {
-                    'id': song['id'],
-                    'song_id': song.get('song_id'),
-                    'title': song.get('title', 'Unknown'),
-                    'artist': song.get('artist', 'Unknown'),
-                    'file_path': song.get('file_path')
-                }
+            return [{
+                'id': song['id'],
+                'song_id': song.get('song_id'),
+                'title': song.get('title', 'Unknown'),
+                'artist': song.get('artist', 'Unknown'),
+                'file_path': song.get('file_path')
+            } for song in data.get('songs', [])[:count]]
     except:
         pass
-    return None
+    return []
 
 def remove_auto_playlist_song(song_id):
     """Remove song from auto-playlist queue and trigger refill"""
     global last_generate_time
     try:
-        requests.delete(f"{SERVER_URL}/api/auto-playlist/{song_id}", timeout=5)
+        http_session.delete(f"{SERVER_URL}/api/auto-playlist/{song_id}", timeout=5)
         # Rate limit generation to once per 5 seconds
-        current_time = time.time()
+        current_time = time.monotonic()
         if current_time - last_generate_time > 5:
-            requests.post(f"{SERVER_URL}/api/auto-playlist/generate", timeout=5)
+            http_session.post(f"{SERVER_URL}/api/auto-playlist/generate", timeout=5)
             last_generate_time = current_time
     except Exception as e:
         print(f"Failed to remove auto-playlist song: {e}")
@@ -434,6 +766,7 @@ def play_queue():
     
     while not stop_event.is_set():
         try:
+            apply_pending_commands()
             # Handle pause state
             with player_state.lock:
                 is_paused = player_state.is_paused
@@ -442,7 +775,8 @@ def play_queue():
                 paused_song_id = player_state.current_song_id
             
             if is_paused:
-                time.sleep(0.25)
+                command_event.wait(0.25)
+                apply_pending_commands()
                 with player_state.lock:
                     still_paused = player_state.is_paused
                     skip = player_state.skip_requested
@@ -466,11 +800,9 @@ def play_queue():
                 continue
             
             # Get queue from database
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
+            cursor = get_db().cursor()
             cursor.execute("SELECT id, song_id, title, artist FROM queue WHERE played = 0 ORDER BY requested_at ASC LIMIT 2")
             songs = cursor.fetchall()
-            conn.close()
             
             if songs:
                 # Play from request queue
@@ -481,8 +813,7 @@ def play_queue():
                 file_path = search_song_in_library(song_id, title, artist)
                 if not file_path:
                     print(f"⚠️  Downloading: {title}")
-                    with download_lock:
-                        file_path = download_from_youtube(song_id, title, artist)
+                    file_path = download_from_youtube(song_id, title, artist)
                 
                 if not file_path:
                     print(f"❌ Could not get: {title}")
@@ -492,7 +823,10 @@ def play_queue():
                 next_file = None
                 if next_song:
                     next_file = search_song_in_library(next_song[1], next_song[2], next_song[3])
-                
+                    if not next_file:
+                        # Download overlaps playback so the crossfade file is ready next iteration
+                        Thread(target=prefetch_song, args=(next_song[1], next_song[2], next_song[3]), daemon=True).start()
+
                 with player_state.lock:
                     player_state.current_song = {'id': queue_id, 'title': title, 'artist': artist}
                     player_state.paused_position = 0
@@ -505,8 +839,9 @@ def play_queue():
                     print(f"⏸️  Paused - not marking as played")
             else:
                 # Queue is empty - play from library auto-playlist
-                auto_song = get_auto_playlist_song()
-                
+                auto_songs = get_auto_playlist_songs(2)
+                auto_song = auto_songs[0] if auto_songs else None
+
                 if auto_song and auto_song.get('file_path'):
                     file_path = auto_song['file_path']
                     title = auto_song.get('title', 'Unknown')
@@ -517,7 +852,7 @@ def play_queue():
                     if not os.path.exists(file_path):
                         print(f"⚠️  File not found: {file_path} - removing from queue")
                         remove_auto_playlist_song(auto_id)
-                        time.sleep(2)
+                        stop_event.wait(2)
                         continue
 
                     print(f"📀 Queue empty - playing from library: {title}")
@@ -526,12 +861,10 @@ def play_queue():
                         player_state.current_song = {'title': title, 'artist': artist, 'auto': True}
                         player_state.paused_position = 0
 
-                    # Get next song from auto-playlist queue for crossfade
-                    next_auto = get_auto_playlist_song()
-                    # Skip first song (current) and get second
+                    # Second song from the same fetch feeds the crossfade
                     next_file = None
-                    if next_auto and next_auto.get('id') != auto_id:
-                        next_file = next_auto.get('file_path')
+                    if len(auto_songs) > 1 and auto_songs[1].get('id') != auto_id:
+                        next_file = auto_songs[1].get('file_path')
 
                     result = play_song_with_crossfade(file_path, next_file, None, is_auto=True)
 
@@ -546,28 +879,71 @@ def play_queue():
 
                     # Rate limit: only generate once every 30 seconds
                     global last_generate_time
-                    current_time = time.time()
+                    current_time = time.monotonic()
                     if current_time - last_generate_time > 30:
                         print("💤 No songs in auto-playlist queue - generating...")
                         try:
-                            requests.post(f"{SERVER_URL}/api/auto-playlist/generate", timeout=5)
+                            http_session.post(f"{SERVER_URL}/api/auto-playlist/generate", timeout=5)
                             last_generate_time = current_time
                         except:
                             pass
-                    time.sleep(10)
+                    stop_event.wait(10)
                     
         except Exception as e:
             print(f"❌ Loop error: {e}")
-            time.sleep(5)
+            stop_event.wait(5)
+
+_search_cache = OrderedDict()  # canonical query -> extracted song list
+_SEARCH_CACHE_MAX = 128
+
+def search_youtube_music(query):
+    """Search YouTube Music, reusing cached results for repeated queries"""
+    cache_key = ' '.join(query.lower().split())
+    if cache_key in _search_cache:
+        _search_cache.move_to_end(cache_key)
+        return _search_cache[cache_key]
+
+    results = ytmusic.search(query, filter='songs', limit=20)
+
+    songs = []
+    for item in results:
+        # Extract artist - handle different response formats
+        artist = 'Unknown Artist'
+        if 'artists' in item and item['artists']:
+            artist = item['artists'][0].get('name', 'Unknown Artist')
+        elif 'artist' in item:
+            artist = item['artist']
+
+        songs.append({
+            'id': item.get('videoId', ''),
+            'title': item.get('title', 'Unknown'),
+            'artist': artist,
+            'duration': item.get('duration', '--:--')
+        })
+
+    _search_cache[cache_key] = songs
+    if len(_search_cache) > _SEARCH_CACHE_MAX:
+        _search_cache.popitem(last=False)
+    return songs
+
+_status_cache = (None, b'')  # last to_dict() snapshot and its encoded body
+
+def get_status_bytes():
+    """Encoded /status body, re-serialized only when the state actually changed"""
+    global _status_cache
+    state = player_state.to_dict()
+    cached_state, cached_bytes = _status_cache
+    if state != cached_state:
+        cached_bytes = json.dumps(state).encode()
+        _status_cache = (state, cached_bytes)
+    return cached_bytes
 
 class ControlHandler(BaseHTTPRequestHandler):
+    disable_nagle_algorithm = True  # control commands are tiny; don't batch them
+
     def do_GET(self):
         if self.path == '/status':
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps(player_state.to_dict()).encode())
+            self._send_json_bytes(get_status_bytes())
         elif self.path.startswith('/search'):
             # Parse query parameter
             parsed = urlparse(self.path)
@@ -578,25 +954,7 @@ class ControlHandler(BaseHTTPRequestHandler):
             
             if ytmusic and query:
                 try:
-                    # Search YouTube Music
-                    results = ytmusic.search(query, filter='songs', limit=20)
-                    
-                    songs = []
-                    for item in results:
-                        # Extract artist - handle different response formats
-                        artist = 'Unknown Artist'
-                        if 'artists' in item and item['artists']:
-                            artist = item['artists'][0].get('name', 'Unknown Artist')
-                        elif 'artist' in item:
-                            artist = item['artist']
-                        
-                        songs.append({
-                            'id': item.get('videoId', ''),
-                            'title': item.get('title', 'Unknown'),
-                            'artist': artist,
-                            'duration': item.get('duration', '--:--')
-                        })
-                    
+                    songs = search_youtube_music(query)
                     print(f"✅ Found {len(songs)} results")
                     self._send_json({'songs': songs})
                 except Exception as e:
@@ -617,43 +975,42 @@ class ControlHandler(BaseHTTPRequestHandler):
         except:
             data = {}
         
-        if self.path == '/skip':
-            with player_state.lock:
-                player_state.skip_requested = True
-                if player_state.is_paused:
-                    player_state.is_paused = False
+        # /control carries the action in the body; the older per-action
+        # endpoints (/skip, /pause, ...) stay as aliases for existing clients
+        action = data.get('action') if self.path == '/control' else self.path.lstrip('/')
+
+        if action == 'skip':
+            push_command('skip')
             if player_state.current_process:
                 try: player_state.current_process.terminate()
                 except: pass
             print("⏭️  Skipped")
             self._send_json({'success': True})
-        elif self.path == '/pause':
-            with player_state.lock:
-                if player_state.is_playing and not player_state.is_paused:
-                    player_state.is_paused = True
-                    print("⏸️  Paused")
+        elif action == 'pause':
+            push_command('pause')
+            print("⏸️  Paused")
             self._send_json({'success': True, 'paused': True})
-        elif self.path == '/resume':
-            with player_state.lock:
-                if player_state.is_paused:
-                    player_state.is_paused = False
-                    print(f"▶️  Resumed")
+        elif action == 'resume':
+            push_command('resume')
+            print(f"▶️  Resumed")
             self._send_json({'success': True, 'paused': False})
-        elif self.path == '/volume':
-            volume = data.get('volume', 100)
-            with player_state.lock:
-                player_state.volume = max(0, min(100, volume))
-            self._send_json({'success': True, 'volume': player_state.volume})
+        elif action == 'volume':
+            volume = max(0, min(100, data.get('volume', 100)))
+            push_command('volume', volume)
+            self._send_json({'success': True, 'volume': volume})
         else:
             self.send_response(404)
             self.end_headers()
     
     def _send_json(self, data):
+        self._send_json_bytes(json.dumps(data).encode())
+
+    def _send_json_bytes(self, payload):
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(payload)
     
     def do_OPTIONS(self):
         self.send_response(200)
@@ -665,8 +1022,13 @@ class ControlHandler(BaseHTTPRequestHandler):
     def log_message(self, format, *args):
         pass
 
+class ControlServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # allow_reuse_address (on by default) already lets a restart rebind through
+    # TIME_WAIT; SO_REUSEPORT would also let a duplicate instance bind silently
+
 def start_control_server():
-    server = HTTPServer(('0.0.0.0', CONTROL_PORT), ControlHandler)
+    server = ControlServer(('0.0.0.0', CONTROL_PORT), ControlHandler)
     print(f"🌐 Control server on port {CONTROL_PORT}")
     server.serve_forever()
 
@@ -680,26 +1042,32 @@ if __name__ == '__main__':
     print("✅ Genre-aware auto-playlist")
     print("=" * 50)
     
-    # Check dependencies
-    print("✅ yt-dlp found")
-    print("✅ ffmpeg found")
-    print("✅ ffprobe found")
-
+    # Check dependencies - PATH lookups, no subprocess forks
+    for cmd in ['ffplay', 'ffmpeg']:
+        if not shutil.which(cmd):
+            print(f"❌ {cmd} not found!")
+            sys.exit(1)
+        print(f"✅ {cmd} found")
+    # ffprobe is only the fallback when mutagen is missing, and the yt-dlp
+    # CLI is only the fallback when the yt_dlp module is missing
+    for cmd in ['ffprobe', 'yt-dlp']:
+        print(f"✅ {cmd} found" if shutil.which(cmd) else f"⚠️  {cmd} not found")
 
-
-   #for cmd, name in [('yt-dlp', 'yt-dlp'), ('ffplay', 'ffmpeg'), ('ffprobe', 'ffprobe')]:
-   #     try:
-   #         subprocess.run([cmd, '-version'], capture_output=True, check=True)
-   #     except:
-   #         print(f"❌ {name} not found!")
-   #         sys.exit(1)
-    
     # Wait for database
     while not os.path.exists(DB_PATH):
         print("⚠️  Waiting for database...")
-        time.sleep(2)
+        stop_event.wait(2)
     print("✅ Database ready")
-    
+
+    # The polling query filters on played and orders by requested_at; make
+    # sure its index exists even if update_db_schema.py was never run here
+    try:
+        conn = get_db()
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_queue_played_requested ON queue(played, requested_at)')
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"⚠️  Could not ensure queue index: {e}")
+
     # Start threads
     Thread(target=process_download_queue, daemon=True).start()
     print("✅ Download queue processor started")
@@ -707,12 +1075,22 @@ if __name__ == '__main__':
     Thread(target=preload_queue, daemon=True).start()
     print("✅ Pre-download service started")
     
-    Thread(target=play_queue, daemon=True).start()
+    playback_thread = Thread(target=play_queue, daemon=True)
+    playback_thread.start()
     print("✅ Playback engine started")
-    
+
     try:
         start_control_server()
     except KeyboardInterrupt:
         print("\n🛑 Shutting down...")
         stop_event.set()
+        # ffplay children live in their own session (spawn_player), so the
+        # terminal's SIGINT never reaches them. Give the playback loop a
+        # moment to exit its wait and stop its process, then terminate
+        # whatever is still playing ourselves.
+        playback_thread.join(timeout=2)
+        for process in (player_state.current_process, player_state.crossfade_process):
+            if process:
+                try: process.terminate()
+                except: pass
         print("✅ Goodbye!")
@@ -16,21 +16,33 @@ print("🔧 Populating music library database...")
 conn = sqlite3.connect(DB_PATH)
 cursor = conn.cursor()
 
-# Get all music files
+# Get all music files - one scandir pass, no pattern matching
 music_files = []
-for file in Path(MUSIC_LIBRARY).glob('*.mp3'):
-    if file.name == 'Placeholder':
-        continue
-    music_files.append(file)
+with os.scandir(MUSIC_LIBRARY) as entries:
+    for entry in entries:
+        if entry.name == 'Placeholder':
+            continue
+        if entry.is_file() and entry.name.lower().endswith('.mp3'):
+            music_files.append(Path(entry.path))
 
 print(f"📁 Found {len(music_files)} music files")
 
+# Fetch the registered paths once instead of running a SELECT per file
+cursor.execute('SELECT file_path FROM music_library')
+existing_paths = {row[0] for row in cursor.fetchall()}
+
 added = 0
 skipped = 0
+rows = []
 
 for file in music_files:
     filename = file.stem  # Without .mp3
-    
+
+    if str(file) in existing_paths:
+        print(f"⏭️  Skipped (already exists): {filename}")
+        skipped += 1
+        continue
+
     # Try to parse "Artist - Title" format
     if ' - ' in filename:
         parts = filename.split(' - ', 1)
@@ -39,28 +51,25 @@ for file in music_files:
     else:
         artist = 'Unknown Artist'
         title = filename
-    
+
     # Generate a song_id from filename
     song_id = filename.replace(' ', '_').replace('-', '_')[:50]
-    
-    # Check if already exists
-    cursor.execute('SELECT id FROM music_library WHERE file_path = ?', [str(file)])
-    if cursor.fetchone():
-        print(f"⏭️  Skipped (already exists): {filename}")
-        skipped += 1
-        continue
-    
-    # Insert into database
+
+    rows.append([song_id, title, artist, str(file), 'general'])
+    print(f"✅ Added: {artist} - {title}")
+
+# Single bulk insert; OR IGNORE skips song_id collisions instead of
+# aborting the whole batch
+if rows:
     try:
-        cursor.execute(
-            '''INSERT INTO music_library (song_id, title, artist, file_path, genre, downloaded)
+        cursor.executemany(
+            '''INSERT OR IGNORE INTO music_library (song_id, title, artist, file_path, genre, downloaded)
                VALUES (?, ?, ?, ?, ?, 1)''',
-            [song_id, title, artist, str(file), 'general']
+            rows
         )
-        print(f"✅ Added: {artist} - {title}")
-        added += 1
+        added = cursor.rowcount
     except Exception as e:
-        print(f"❌ Error adding {filename}: {e}")
+        print(f"❌ Error adding songs: {e}")
 
 conn.commit()
 conn.close()
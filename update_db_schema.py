@@ -18,9 +18,13 @@ if 'requester_name' not in columns:
 else:
     print("  ✓ requester_name column already exists")
 
-# Create auto_playlist_queue table
-print("  → Creating auto_playlist_queue table...")
-cursor.execute('''
+# The rest of the migration is pure IF NOT EXISTS DDL - run it as one
+# script so a re-run (or a run after a partial failure) is a clean no-op.
+# Indexes cover the hot lookups: queue is filtered on played and ordered by
+# requested_at, recently_played is shown newest-first, and
+# auto_playlist_queue is consumed in queue_position order.
+print("  → Creating auto_playlist_queue table and indexes...")
+cursor.executescript('''
 CREATE TABLE IF NOT EXISTS auto_playlist_queue (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     song_id TEXT NOT NULL,
@@ -29,9 +33,12 @@ CREATE TABLE IF NOT EXISTS auto_playlist_queue (
     file_path TEXT NOT NULL,
     queue_position INTEGER NOT NULL,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-)
+);
+CREATE INDEX IF NOT EXISTS idx_queue_played_requested ON queue(played, requested_at);
+CREATE INDEX IF NOT EXISTS idx_recently_played_at ON recently_played(played_at);
+CREATE INDEX IF NOT EXISTS idx_auto_playlist_position ON auto_playlist_queue(queue_position);
 ''')
-print("  ✅ Created auto_playlist_queue table")
+print("  ✅ Schema up to date")
 
 conn.commit()
 conn.close()